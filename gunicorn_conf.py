@@ -0,0 +1,15 @@
+# Gunicorn configuration for running the FastAPI app in production
+# Usage: gunicorn main:app -c gunicorn_conf.py
+import os
+
+bind = "0.0.0.0:8000"
+# Each worker has its own in-memory store, so default to a single one;
+# raise WEB_CONCURRENCY only once storage moves out of process
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master so workers share its pages copy-on-write
+preload_app = True
+
+# No max_requests: items live only in worker memory, so recycling a worker
+# would silently drop everything it held
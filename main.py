@@ -1,69 +1,162 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import uuid
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+import asyncio
+import functools
+import os
+from secrets import token_hex
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
 from datetime import datetime
+import anyio.to_thread
+import orjson
+from sortedcontainers import SortedList
+
+# Coarse timestamp for /health, refreshed once per second by a background task
+_TICK_INTERVAL = 1.0
+_now_iso = datetime.now().isoformat()
+
+async def _tick():
+    global _now_iso
+    while True:
+        _now_iso = datetime.now().isoformat()
+        await asyncio.sleep(_TICK_INTERVAL)
+
+# Bound the worker threads used for any sync code so bursts can't spawn unbounded threads
+_MAX_THREADS = min(32, (os.cpu_count() or 1) * 4)
+
+# Startup and shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=_MAX_THREADS)
+    asyncio.get_running_loop().set_default_executor(executor)
+    # Starlette dispatches sync handlers through anyio, which keeps its own limiter
+    anyio.to_thread.current_default_thread_limiter().total_tokens = _MAX_THREADS
+    tick_task = asyncio.create_task(_tick())
+    yield
+    tick_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await tick_task
+    executor.shutdown(wait=False)
 
 # Create FastAPI instance
 app = FastAPI(
     title="FastAPI Demo",
     description="A simple FastAPI demo application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# CORS is only needed for browser clients; paths like /health skip it entirely
+_CORS_EXEMPT_PATHS = frozenset({"/health"})
+
+class _CORSMiddleware(CORSMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in _CORS_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Add CORS middleware only when ALLOWED_ORIGINS (comma-separated) is set
+_allowed_origins = [origin.strip() for origin in os.environ.get("ALLOWED_ORIGINS", "").split(",") if origin.strip()]
+if _allowed_origins:
+    app.add_middleware(
+        _CORSMiddleware,
+        allow_origins=_allowed_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 # Pydantic models
 class Item(BaseModel):
-    id: Optional[str] = None
+    id: str | None = None
     name: str
-    description: Optional[str] = None
+    description: str | None = None
     price: float
     is_available: bool = True
-    created_at: Optional[datetime] = None
+    created_at: datetime | None = None
 
 class ItemCreate(BaseModel):
     name: str
-    description: Optional[str] = None
-    price: float
+    description: str | None = None
+    price: float = Field(allow_inf_nan=False)
     is_available: bool = True
 
 class ItemUpdate(BaseModel):
-    name: Optional[str] = None
-    description: Optional[str] = None
-    price: Optional[float] = None
-    is_available: Optional[bool] = None
+    name: str | None = None
+    description: str | None = None
+    price: float | None = Field(None, allow_inf_nan=False)
+    is_available: bool | None = None
+
+    # These may be omitted, but an explicit null would leave the item invalid
+    @field_validator("name", "price", "is_available")
+    @classmethod
+    def _reject_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+# Stored item record; slots keep per-item memory well below a plain dict
+@dataclass(slots=True)
+class StoredItem:
+    id: str
+    name: str
+    description: str | None
+    price: float
+    is_available: bool
+    created_at: str
 
 # In-memory storage (in a real app, you'd use a database)
-items_db = []
+items_db: dict[str, StoredItem] = {}
+
+# Secondary indexes for search, kept in sync with items_db on every write
+_price_index = SortedList(key=lambda entry: entry[0])  # (price, id)
+_name_lower: dict[str, str] = {}  # id -> lowercased name
+
+# Called on every write so no stale search results are served or kept in memory
+def _invalidate_search_cache():
+    _search_cached.cache_clear()
+
+# Number of items serialized per chunk when streaming GET /items
+_STREAM_CHUNK_SIZE = 100
+
+# Constant responses serialized once at import time
+_ROOT_BYTES = orjson.dumps({"message": "Welcome to FastAPI Demo!", "version": "1.0.0"})
 
 # Root endpoint
 @app.get("/")
 async def root():
-    return {"message": "Welcome to FastAPI Demo!", "version": "1.0.0"}
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now()}
+    content = orjson.dumps({"status": "healthy", "timestamp": _now_iso})
+    return Response(content=content, media_type="application/json")
 
 # Get all items
-@app.get("/items", response_model=List[Item])
+@app.get("/items", response_model=list[Item])
 async def get_items():
-    return items_db
+    # Stored items are already validated, so stream them as a JSON array instead
+    # of building the whole payload in memory; response_model only documents it
+    items = list(items_db.values())  # snapshot so concurrent writes can't break iteration
+
+    async def generate():
+        yield b"["
+        for start in range(0, len(items), _STREAM_CHUNK_SIZE):
+            chunk = b",".join(orjson.dumps(item) for item in items[start:start + _STREAM_CHUNK_SIZE])
+            yield chunk if start == 0 else b"," + chunk
+        yield b"]"
+
+    return StreamingResponse(generate(), media_type="application/json")
 
 # Get item by ID
 @app.get("/items/{item_id}", response_model=Item)
 async def get_item(item_id: str):
-    item = next((item for item in items_db if item["id"] == item_id), None)
+    item = items_db.get(item_id)
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return item
@@ -71,56 +164,81 @@ async def get_item(item_id: str):
 # Create new item
 @app.post("/items", response_model=Item)
 async def create_item(item: ItemCreate):
-    new_item = Item(
-        id=str(uuid.uuid4()),
+    # ItemCreate is already validated, so build the stored record directly
+    new_item = StoredItem(
+        id=token_hex(16),
         name=item.name,
         description=item.description,
         price=item.price,
         is_available=item.is_available,
-        created_at=datetime.now()
+        created_at=datetime.now().isoformat(),
     )
-    items_db.append(new_item.model_dump())
-    return new_item
+    items_db[new_item.id] = new_item
+    _price_index.add((new_item.price, new_item.id))
+    _name_lower[new_item.id] = new_item.name.lower()
+    _invalidate_search_cache()
+    return Response(content=orjson.dumps(new_item), media_type="application/json")
 
 # Update item
 @app.put("/items/{item_id}", response_model=Item)
 async def update_item(item_id: str, item_update: ItemUpdate):
-    item_index = next((i for i, item in enumerate(items_db) if item["id"] == item_id), None)
-    if item_index is None:
+    item = items_db.get(item_id)
+    if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    # Update only provided fields
-    for field, value in item_update.model_dump(exclude_unset=True).items():
-        items_db[item_index][field] = value
+    # Update only provided fields, read straight off the model without dumping it
+    fields_set = item_update.model_fields_set
+    old_price = item.price
+    for field in fields_set:
+        setattr(item, field, getattr(item_update, field))
+    
+    # Keep the search indexes in step with the updated record
+    if item.price != old_price:
+        _price_index.remove((old_price, item_id))
+        _price_index.add((item.price, item_id))
+    if "name" in fields_set:
+        _name_lower[item_id] = item.name.lower()
+    _invalidate_search_cache()
     
-    return items_db[item_index]
+    return item
 
 # Delete item
 @app.delete("/items/{item_id}")
 async def delete_item(item_id: str):
-    item_index = next((i for i, item in enumerate(items_db) if item["id"] == item_id), None)
-    if item_index is None:
+    deleted_item = items_db.pop(item_id, None)
+    if deleted_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    deleted_item = items_db.pop(item_index)
+    _price_index.remove((deleted_item.price, item_id))
+    del _name_lower[item_id]
+    _invalidate_search_cache()
     return {"message": "Item deleted successfully", "deleted_item": deleted_item}
 
 # Search items
-@app.get("/items/search/", response_model=List[Item])
-async def search_items(q: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None):
-    filtered_items = items_db
-    
-    if q:
-        filtered_items = [item for item in filtered_items if q.lower() in item["name"].lower()]
-    
-    if min_price is not None:
-        filtered_items = [item for item in filtered_items if item["price"] >= min_price]
-    
-    if max_price is not None:
-        filtered_items = [item for item in filtered_items if item["price"] <= max_price]
-    
-    return filtered_items
+@app.get("/items/search/", response_model=list[Item])
+async def search_items(
+    q: str | None = None,
+    min_price: float | None = Query(None, allow_inf_nan=False),
+    max_price: float | None = Query(None, allow_inf_nan=False),
+):
+    q_lower = q.lower() if q else None
+    content = _search_cached(q_lower, min_price, max_price)
+    return Response(content=content, media_type="application/json")
+
+@functools.lru_cache(maxsize=512)
+def _search_cached(q_lower: str | None, min_price: float | None, max_price: float | None) -> bytes:
+    # Single pass over the price range, filtering candidates by name as we go
+    return orjson.dumps([
+        items_db[item_id]
+        for _, item_id in _price_index.irange_key(min_price, max_price)
+        if q_lower is None or q_lower in _name_lower[item_id]
+    ])
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        # Each worker has its own in-memory store, so default to a single one
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+    )